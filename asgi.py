@@ -0,0 +1,471 @@
+# asgi.py - opcjonalny tryb ASGI z asynchronicznym dostępem do bazy
+#
+# Uruchomienie (zależności: pip install -r requirements-async.txt):
+#   uvicorn asgi:application --host 0.0.0.0 --port $PORT --workers 4
+# Testy obu trybów (pip install -r requirements-test.txt):
+#   python -m pytest tests
+#
+# Gorące endpointy (/send_message, /get_messages, /get_user_details, /check_user) obsługują tu
+# korutyny na asynchronicznym silniku SQLAlchemy (asyncpg; lokalnie aiosqlite), więc czekanie na
+# bazę albo wolnego klienta nie blokuje wątku. Wszystko inne (w tym preflight CORS) trafia do
+# niezmienionej aplikacji Flask przez adapter WSGI, a app.py dalej działa samodzielnie pod gunicornem.
+# Odpowiedzi i walidacja są takie same jak w app.py - zapytania, walidację, treść odpowiedzi i kompresję
+# budują wspólne funkcje, a tests/test_hot_endpoints.py sprawdza oba tryby tymi samymi testami.
+#
+# Żądania Flask wykonuje pula ASGI_WSGI_THREADS wątków (nie jeden wspólny wątek asgiref), więc
+# czekający long-poll albo strumień SSE zajmuje jeden wątek puli, a nie blokuje reszty API.
+# Dlatego w tym trybie strumieniowanie jest domyślnie włączone (STREAMING_ENABLED=1).
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+from urllib.parse import parse_qsl
+
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 32))
+# Przed importem app.py - tam te wartości są czytane
+os.environ.setdefault('STREAMING_ENABLED', '1')
+os.environ.setdefault('DB_POOL_SIZE', str(ASGI_WSGI_THREADS + 1))
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.http import parse_accept_header, parse_etags
+
+import app as anonlink
+from app import Message, db, logger
+
+def async_database_url(url):
+    """Maps the sync DATABASE_URL to its async driver (asyncpg / aiosqlite)."""
+    if url.startswith('postgresql://') or url.startswith('postgresql+psycopg2://'):
+        url = 'postgresql+asyncpg://' + url.split('://', 1)[1]
+        # asyncpg nie zna parametru sslmode z libpq
+        return url.replace('sslmode=', 'ssl=')
+    if url.startswith('sqlite://'):
+        return 'sqlite+aiosqlite://' + url[len('sqlite://'):]
+    return url
+
+ASYNC_DATABASE_URL = os.environ.get('ASYNC_DATABASE_URL', async_database_url(anonlink.DATABASE_URL))
+# Jedno połączenie obsługuje wiele korutyn po kolei, więc pula może być mniejsza niż liczba żądań w toku
+ASYNC_DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE', 10))
+ASYNC_DB_MAX_OVERFLOW = int(os.environ.get('ASYNC_DB_MAX_OVERFLOW', 10))
+
+def build_async_engine():
+    options = {}
+    if ASYNC_DATABASE_URL.startswith('postgresql'):
+        options = {
+            'pool_size': ASYNC_DB_POOL_SIZE,
+            'max_overflow': ASYNC_DB_MAX_OVERFLOW,
+            'pool_timeout': anonlink.DB_POOL_TIMEOUT,
+            'pool_recycle': anonlink.DB_POOL_RECYCLE,
+            'pool_pre_ping': anonlink.DB_POOL_PRE_PING
+        }
+    return create_async_engine(ASYNC_DATABASE_URL, **options)
+
+async_engine = build_async_engine()
+AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+def build_replica_engines():
+    """Async engines for the read replicas, keyed like app.config['SQLALCHEMY_BINDS']."""
+    engines = {}
+    for key, options in anonlink.app.config['SQLALCHEMY_BINDS'].items():
+        engine = create_async_engine(async_database_url(options['url']))
+        watch_replica(key, engine)
+        engines[key] = engine
+    return engines
+
+def watch_replica(key, engine):
+    @db.event.listens_for(engine.sync_engine, 'handle_error')
+    def replica_error(context):
+        # Jak w app.py - zerwane połączenie wyłącza replikę z rotacji od razu
+        if context.is_disconnect or context.connection is None:
+            anonlink.replica_router.mark_down(key, str(context.original_exception).splitlines()[0])
+
+replica_engines = build_replica_engines()
+
+class AsyncReadRoute:
+    """Replica chosen lazily for one request - the async counterpart of app.ReadRoute."""
+    __slots__ = ('_key', '_picked')
+
+    def __init__(self):
+        self._key = None
+        self._picked = False
+
+    def key(self):
+        if not self._picked:
+            with anonlink.app.app_context(): # Wątek sprawdzania replik startuje przy pierwszym wyborze
+                self._key = anonlink.replica_router.pick_key()
+            self._picked = True
+        return self._key
+
+    def forget(self):
+        self._key = None
+        self._picked = True
+
+current_read_route = contextvars.ContextVar('asgi_read_route', default=None)
+
+class AsgiRequest:
+    """The parts of an HTTP request the async handlers need."""
+
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.query_string = scope.get('query_string', b'')
+        self.args = {}
+        for name, value in parse_qsl(self.query_string.decode('latin-1'), keep_blank_values=True):
+            self.args.setdefault(name, value) # Jak request.args.get() - pierwsza wartość
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        self.body = body
+        client = scope.get('client')
+        self.remote_addr = client[0] if client else ''
+
+    def get_json(self):
+        try:
+            return anonlink.app.json.loads(self.body) if self.body else None
+        except ValueError:
+            return None
+
+    def client_ip(self):
+        # Ta sama reguła co ProxyFix w app.py - wpis dopisany przez zaufane proxy, nie przez klienta
+        return anonlink.trusted_client_ip(self.headers.get('x-forwarded-for'), self.remote_addr)
+
+    def reported_ip(self):
+        # Jak get_client_ip() w app.py - tylko do logów aktywności
+        return anonlink.reported_client_ip(self.headers.get('x-forwarded-for'), self.headers.get('x-real-ip'), self.remote_addr)
+
+    def sender_fingerprint(self):
+        raw = f"{self.client_ip()}|{self.headers.get('user-agent', '')[:200]}"
+        return anonlink.hashlib.blake2b(raw.encode('utf-8'), digest_size=8).hexdigest()
+
+def json_response(payload, status=200, headers=None):
+    """Flask response object built the same way as jsonify() in app.py."""
+    response = anonlink.app.json.response(payload)
+    response.status_code = status
+    response.headers.update(headers or {})
+    return response
+
+def finalize_response(request, response, request_id):
+    """CORS, request ID and compression - what Flask-Cors and the after_request hooks do in app.py."""
+    origin = request.headers.get('origin')
+    if origin in anonlink.CORS_ORIGINS:
+        response.headers['Access-Control-Allow-Origin'] = origin
+        response.vary.add('Origin')
+    response.headers['X-Request-ID'] = request_id
+    return anonlink.compress_for_client(response, anonlink.choose_encoding(parse_accept_header(request.headers.get('accept-encoding'))))
+
+async def run_sync(fn, *args):
+    """Runs blocking app.py code (Redis, group commit, filter rebuild) in a thread with an app context."""
+    def call():
+        with anonlink.app.app_context():
+            return fn(*args)
+    return await asyncio.to_thread(call)
+
+async def load_user_row(session, filters):
+    """Async counterpart of app.load_user_record(): the request's replica first, a miss confirmed on the primary."""
+    statement = anonlink.user_record_statement(**filters)
+    route = current_read_route.get()
+    key = route.key() if route is not None else None
+    if key is not None:
+        try:
+            async with replica_engines[key].connect() as connection:
+                row = (await connection.execute(statement)).first()
+        except Exception as e:
+            # Replika padła w trakcie żądania - wypada z rotacji, a to żądanie czyta z primary
+            anonlink.replica_router.mark_down(key, str(e).splitlines()[0] if str(e) else type(e).__name__)
+            route.forget()
+        else:
+            if row is not None:
+                return row
+    return (await session.execute(statement)).first()
+
+async def find_user(session, username=None, user_id=None):
+    """Async counterpart of app.find_user() sharing the same cache."""
+    if username:
+        key, filters = f'name:{username}', {'username': username}
+    elif user_id:
+        key, filters = f'id:{user_id}', {'id': user_id}
+    else:
+        return None
+    cache = anonlink.user_cache
+    # Wspólny poziom cache (Redis) to blokujące I/O - wtedy w wątku
+    record = cache.get_cached(key) if cache.shared is None else await asyncio.to_thread(cache.get_cached, key)
+    if record is None:
+        row = await load_user_row(session, filters)
+        loaded = anonlink.UserRecord(*row) if row else None
+        record = cache.put(key, loaded) if cache.shared is None else await asyncio.to_thread(cache.put, key, loaded)
+    return None if record is anonlink.USER_NOT_FOUND else record
+
+def queue_activity_log(request, activity_data):
+    anonlink.background_tasks.submit(
+        anonlink.report_activity,
+        activity_data,
+        request.reported_ip(),
+        request.headers.get('user-agent', 'Unknown')
+    )
+
+# ===== HANDLERY =====
+
+def message_event(row):
+    return {
+        'id': row['id'],
+        'message': row['message'],
+        'timestamp': row['timestamp'].isoformat(),
+        'read': row['read'],
+        'cursor': anonlink.encode_cursor(row['timestamp'], row['id'])
+    }
+
+async def send_message(request, session):
+    """Async /send_message (same rules and responses as app.send_message)."""
+    try:
+        recipient_username, message_content = anonlink.parse_send_message(request.get_json())
+    except anonlink.SendMessageError as e:
+        return json_response({'success': False, 'message': str(e)}, 400)
+
+    limiter = anonlink.send_rate_limiter
+    if isinstance(limiter.backend, anonlink.InMemoryRateLimiter):
+        retry_after = limiter.check(request.sender_fingerprint(), recipient_username)
+    else:
+        retry_after = await asyncio.to_thread(limiter.check, request.sender_fingerprint(), recipient_username)
+    if retry_after:
+        payload, headers = anonlink.rate_limited_reply(retry_after)
+        return json_response(payload, 429, headers)
+
+    recipient_user = await find_user(session, username=recipient_username)
+    if not recipient_user:
+        return json_response({'success': False, 'message': 'Użytkownik nie istnieje'}, 404)
+
+    row = {
+        'id': anonlink.generate_id(),
+        'message': message_content,
+        'timestamp': datetime.utcnow(),
+        'read': False,
+        'user_id': recipient_user.id
+    }
+    notifier = anonlink.inbox_notifier
+    try:
+        if anonlink.message_writer is not None:
+            await run_sync(anonlink.message_writer.write, row)
+        else:
+            await session.execute(Message.__table__.insert().values(**row))
+            await session.execute(anonlink.bump_inbox_version([row['user_id']]))
+            if isinstance(notifier, anonlink.PostgresInboxNotifier):
+                # NOTIFY w tej samej transakcji - Postgres dostarczy je dopiero po commicie
+                await session.execute(db.text("SELECT pg_notify(:channel, :payload)"), {
+                    'channel': anonlink.INBOX_NOTIFY_CHANNEL,
+                    'payload': anonlink.json.dumps({'user_id': row['user_id'], 'event': message_event(row)})
+                })
+            await session.commit()
+    except IntegrityError as e:
+        await session.rollback()
+        if (await session.execute(anonlink.user_record_statement(id=recipient_user.id))).first() is None:
+            # Konto usunięte w innym workerze, a wpis w cache jeszcze nie wygasł (klucz obcy)
+            anonlink.invalidate_user(username=recipient_username)
+            return json_response({'success': False, 'message': 'Użytkownik nie istnieje'}, 404)
+        logger.error(f"Konflikt klucza przy zapisie wiadomości {row['id']}: {str(e)}")
+        return json_response({'success': False, 'message': 'Błąd serwera'}, 500)
+    except anonlink.GroupCommitTimeout:
+        logger.warning("⚠️ Zapis paczki wiadomości nie zdążył - wiadomość wycofana.")
+        return json_response({
+            'success': False,
+            'message': 'Serwer jest przeciążony - wiadomość nie została wysłana. Spróbuj ponownie.'
+        }, 503)
+    if anonlink.message_writer is not None and isinstance(notifier, anonlink.PostgresInboxNotifier):
+        # pg_notify na osobnym połączeniu z puli synchronicznej
+        await run_sync(anonlink.notify_new_message, SimpleNamespace(**row))
+    elif not isinstance(notifier, anonlink.PostgresInboxNotifier):
+        anonlink.notify_new_message(SimpleNamespace(**row))
+
+    if anonlink.replica_router is not None:
+        # Jak pin_after_write w app.py - ten nadawca przez chwilę czyta z primary
+        if anonlink.user_cache.shared is None:
+            anonlink.read_your_writes.pin(request.sender_fingerprint())
+        else:
+            await asyncio.to_thread(anonlink.read_your_writes.pin, request.sender_fingerprint())
+    logger.info("Wiadomość wysłana do %s", recipient_username)
+    queue_activity_log(request, {
+        "title": "Wysłano Wiadomość",
+        "description": f"Odbiorca: {recipient_username}\nID Odbiorcy: {recipient_user.id}\nWiadomość: {message_content[:200]}...",
+        "color": 5763719 # Green
+    })
+    return json_response({'success': True, 'message': 'Wiadomość wysłana!'})
+
+async def get_messages(request, session):
+    """Async /get_messages (limit/before/since modes and ETag handling as in app.get_messages)."""
+    username = request.args.get('user', '').strip()
+    user_id = request.args.get('user_id', '').strip()
+    user = await find_user(session, username=username, user_id=user_id)
+    if not user:
+        return json_response({'success': False, 'message': 'Użytkownik nie istnieje'}, 404)
+
+    limit_param, before_param, since_param, paginated = anonlink.inbox_request_params(request.args)
+    if before_param and since_param:
+        return json_response({'success': False, 'message': 'Parametry before i since wykluczają się'}, 400)
+
+    version = (await session.execute(anonlink.inbox_version_statement(user.id))).one()
+    etag = anonlink.inbox_etag(user.id, version, request.query_string)
+    if parse_etags(request.headers.get('if-none-match')).contains_weak(etag): # Po kompresji ETag jest słaby (W/)
+        response = anonlink.app.response_class(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    try:
+        limit, before, since = anonlink.parse_inbox_params(limit_param, before_param, since_param)
+    except ValueError:
+        return json_response({'success': False, 'message': 'Nieprawidłowy parametr limit, before lub since'}, 400)
+
+    rows = (await session.execute(anonlink.inbox_page_statement(user.id, limit, before, since, paginated))).all()
+    response = json_response(anonlink.inbox_page_payload(rows, limit, before_param, since_param, paginated))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+async def get_user_details(request, session):
+    """Async /get_user_details."""
+    username = request.args.get('username', '').strip()
+    user_id = request.args.get('user_id', '').strip()
+    user_data = await find_user(session, username=username, user_id=user_id)
+    if not user_data:
+        return json_response({'exists': False, 'message': 'Nazwa użytkownika lub ID jest wymagane'}, 400)
+    return json_response(anonlink.user_details_payload(user_data))
+
+async def check_user(request, session):
+    """Async /check_user; a "definitely free" answer from the username filter skips the database."""
+    username = request.args.get('user', '').strip()
+    if not username:
+        return json_response({'exists': False, 'message': 'Brak nazwy użytkownika'}, 400)
+    # Filtr odpowiada z pamięci (budowany w wątku tła), więc można go wołać z pętli zdarzeń
+    exists = anonlink.username_might_exist(username) and await find_user(session, username=username) is not None
+    return json_response({'exists': exists, 'username': username if exists else None})
+
+ROUTES = {
+    ('POST', '/send_message'): send_message,
+    ('GET', '/get_messages'): get_messages,
+    ('GET', '/get_user_details'): get_user_details,
+    ('GET', '/check_user'): check_user
+}
+
+ERROR_BODIES = {
+    'send_message': {'success': False, 'message': 'Błąd serwera'},
+    'get_messages': {'success': False, 'message': 'Błąd serwera'},
+    'get_user_details': {'exists': False, 'message': 'Błąd serwera'},
+    'check_user': {'exists': False, 'error': 'Błąd serwera'}
+}
+
+# ===== APLIKACJA ASGI =====
+
+wsgi_executor = ThreadPoolExecutor(max_workers=ASGI_WSGI_THREADS, thread_name_prefix='wsgi')
+
+def unwrapped_run_wsgi_app():
+    """The plain function behind asgiref's @sync_to_async WsgiToAsgiInstance.run_wsgi_app.
+
+    WsgiToAsgi has no public way to pass an executor, so this relies on asgiref internals - asgiref
+    is pinned in requirements-async.txt and tests/test_asgi_adapter.py fails if they change."""
+    func = getattr(WsgiToAsgiInstance.__dict__.get('run_wsgi_app'), 'func', None)
+    if not callable(func):
+        raise RuntimeError(
+            'asgiref zmienił WsgiToAsgiInstance.run_wsgi_app - sprawdź wersję przypiętą w requirements-async.txt'
+        )
+    return func
+
+class PooledWsgiToAsgiInstance(WsgiToAsgiInstance):
+    # asgiref domyślnie (thread_sensitive=True) wykonuje wszystkie żądania WSGI w jednym wspólnym wątku -
+    # jeden czekający long-poll blokowałby wtedy całą resztę API
+    run_wsgi_app = sync_to_async(unwrapped_run_wsgi_app(), thread_sensitive=False, executor=wsgi_executor)
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi that runs each request on a thread of wsgi_executor."""
+
+    async def __call__(self, scope, receive, send):
+        await PooledWsgiToAsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+wsgi_application = PooledWsgiToAsgi(anonlink.app)
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+async def read_route(request, endpoint):
+    """Replica routing for one request, as app.route_reads() does for the Flask views."""
+    router = anonlink.replica_router
+    if router is None or endpoint not in anonlink.READ_REPLICA_ENDPOINTS:
+        return None
+    fingerprint = request.sender_fingerprint()
+    if anonlink.user_cache.shared is None:
+        pinned = anonlink.read_your_writes.is_pinned(fingerprint)
+    else:
+        pinned = await asyncio.to_thread(anonlink.read_your_writes.is_pinned, fingerprint)
+    if pinned:
+        router.count('pinned_reads')
+        return None
+    return AsyncReadRoute()
+
+async def handle(scope, receive, send, handler):
+    request = AsgiRequest(scope, await read_body(receive))
+    endpoint = handler.__name__
+    request_id = request.headers.get('x-request-id', '')
+    if not anonlink.REQUEST_ID_PATTERN.match(request_id):
+        request_id = os.urandom(8).hex()
+    rate = anonlink.LOG_SAMPLE_ROUTES.get(endpoint, 1.0)
+    log_context = anonlink.RequestLogContext(request_id, endpoint, rate >= 1 or anonlink.random.random() < rate)
+    anonlink.current_log_context.set(log_context)
+    anonlink.request_metrics.start()
+    started_at = time.perf_counter()
+    try:
+        current_read_route.set(await read_route(request, endpoint))
+        async with AsyncSession() as session:
+            response = await handler(request, session)
+    except Exception as e:
+        logger.error(f"Błąd w handlerze ASGI {endpoint}: {str(e)}")
+        response = json_response(ERROR_BODIES[endpoint], 500)
+    response = finalize_response(request, response, request_id)
+    body = response.get_data()
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers.to_wsgi_list()]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+    duration = time.perf_counter() - started_at
+    anonlink.request_metrics.finish(endpoint, request.method, response.status_code, duration)
+    logger.info('request', extra={'fields': {
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 2),
+        'origin': request.headers.get('origin'),
+        'mode': 'asgi'
+    }})
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Handlery async omijają before_request z app.py - przegląd zadań usuwania startujemy tutaj
+            anonlink.deletion_job_sweeper.ensure_started()
+            if anonlink.username_filter is not None:
+                anonlink.username_filter.ensure_started()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await async_engine.dispose()
+            for engine in replica_engines.values():
+                await engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    """ASGI entry point: async handlers for the hot endpoints, Flask (WSGI) for the rest."""
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] == 'http':
+        handler = ROUTES.get((scope['method'], scope['path']))
+        if handler is not None:
+            return await handle(scope, receive, send, handler)
+    return await wsgi_application(scope, receive, send)
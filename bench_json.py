@@ -0,0 +1,93 @@
+# bench_json.py - mikrobenchmark serializacji JSON i kompresji odpowiedzi
+#
+# Użycie:
+#   python bench_json.py
+#   python bench_json.py --users 500 --messages 200 --repeat 30
+#
+# Dla kilku endpointów porównuje encoder stdlib (jak dotąd) z orjson: czas CPU samej serializacji
+# (app.json.dumps/response) i czas całego żądania, a także liczbę bajtów odpowiedzi bez kompresji,
+# z gzip i z br (jeśli zainstalowany jest moduł brotli). Dane testowe zakłada bench_api.seed().
+import argparse
+import statistics
+import time
+
+import bench_api # Ustawia środowisko (tymczasowa baza SQLite, limity) przed importem aplikacji
+import app as anonlink
+
+def endpoints(usernames):
+    inbox = usernames[0]
+    return [
+        ('get_messages (cała skrzynka)', f'/get_messages?user={inbox}'),
+        ('get_messages (limit=50)', f'/get_messages?user={inbox}&limit=50'),
+        ('api/users (per_page=1000)', '/api/users?per_page=1000'),
+        ('export_all_data (json)', '/export_all_data'),
+        ('export_all_data (ndjson)', '/export_all_data?format=ndjson')
+    ]
+
+class TimedProvider:
+    """Wraps a JSON provider and accumulates CPU time spent in dumps()/response()."""
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.seconds = 0.0
+
+    def __getattr__(self, name):
+        return getattr(self.provider, name)
+
+    def _timed(self, fn, *args, **kwargs):
+        started_at = time.thread_time()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.seconds += time.thread_time() - started_at
+
+    def dumps(self, obj, **kwargs):
+        return self._timed(self.provider.dumps, obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        return self._timed(self.provider.response, *args, **kwargs)
+
+def measure(client, path, repeat, accept_encoding):
+    """Returns (median serialization ms, median request ms, response bytes)."""
+    timed = anonlink.app.json
+    serialization, latencies = [], []
+    size = 0
+    for _ in range(repeat):
+        timed.seconds = 0.0
+        started_at = time.perf_counter()
+        response = client.get(path, headers={'Accept-Encoding': accept_encoding})
+        size = len(response.get_data())
+        response.close()
+        latencies.append(time.perf_counter() - started_at)
+        serialization.append(timed.seconds)
+    return statistics.median(serialization) * 1000, statistics.median(latencies) * 1000, size
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark serializacji JSON i kompresji odpowiedzi.')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=100, help='wiadomości na skrzynkę')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    usernames = bench_api.seed(args.users, args.messages)
+    client = anonlink.app.test_client()
+    providers = [('stdlib', anonlink.StdlibJSONProvider(anonlink.app))]
+    if anonlink.orjson is not None:
+        providers.append(('orjson', anonlink.OrjsonJSONProvider(anonlink.app)))
+    else:
+        print('orjson nie jest zainstalowany - tylko stdlib')
+    encodings = ['identity', 'gzip'] + (['br'] if anonlink.brotli is not None else [])
+
+    print(f"Dane: {args.users} użytkowników x {args.messages} wiadomości, {args.repeat} powtórzeń (mediany)")
+    print(f"{'endpoint':<30} {'encoder':<7} {'serializ. ms':>12} {'żądanie ms':>11} " +
+          ' '.join(f'{encoding + " B":>10}' for encoding in encodings))
+    for name, path in endpoints(usernames):
+        for provider_name, provider in providers:
+            anonlink.app.json = TimedProvider(provider)
+            serialization_ms, request_ms, _ = measure(client, path, args.repeat, 'identity')
+            sizes = [measure(client, path, 1, encoding)[2] for encoding in encodings]
+            print(f"{name:<30} {provider_name:<7} {serialization_ms:>12.2f} {request_ms:>11.2f} " +
+                  ' '.join(f'{size:>10}' for size in sizes))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# discord_stub.py - lokalna atrapa webhooka Discorda do testów dispatchera
+#
+# Użycie:
+#   python discord_stub.py --port 8765 --limit 5 --window 2
+#   DISCORD_WEBHOOK_URL=http://127.0.0.1:8765/api/webhooks/1/test python app.py
+#
+# Atrapa zachowuje się jak Discord: przyjmuje maks. 10 embedów na wiadomość, liczy limit
+# żądań w oknie czasowym i odpowiada 429 z Retry-After oraz nagłówkami X-RateLimit-*.
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class RateLimitedWebhookStub:
+    """Fixed-window rate limiter plus counters shared by all handler threads."""
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.used = 0
+        self.stats = {'requests': 0, 'accepted': 0, 'rate_limited': 0, 'rejected': 0, 'embeds': 0}
+        self.batches = [] # Tytuły embedów każdej przyjętej paczki, w kolejności przyjęcia
+
+    def take(self):
+        """Returns (allowed, remaining, reset_after)."""
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= self.window:
+                self.window_start = now
+                self.used = 0
+            reset_after = self.window - (now - self.window_start)
+            self.stats['requests'] += 1
+            if self.used >= self.limit:
+                self.stats['rate_limited'] += 1
+                return False, 0, reset_after
+            self.used += 1
+            return True, self.limit - self.used, reset_after
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+def make_handler(stub):
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if not self.path.startswith('/api/webhooks/'):
+                return self._reply(404, {'message': 'Unknown Webhook'})
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                stub.count('rejected')
+                return self._reply(400, {'message': 'Invalid JSON'})
+
+            allowed, remaining, reset_after = stub.take()
+            headers = {
+                'X-RateLimit-Limit': str(stub.limit),
+                'X-RateLimit-Remaining': str(remaining),
+                'X-RateLimit-Reset-After': f'{reset_after:.3f}',
+                'X-RateLimit-Bucket': 'stub'
+            }
+            if not allowed:
+                headers['Retry-After'] = f'{reset_after:.3f}'
+                return self._reply(429, {'message': 'You are being rate limited.', 'retry_after': reset_after, 'global': False}, headers)
+
+            embeds = payload.get('embeds', [])
+            if not embeds or len(embeds) > 10:
+                stub.count('rejected')
+                return self._reply(400, {'message': 'Invalid Form Body', 'embeds': len(embeds)}, headers)
+
+            stub.count('accepted')
+            stub.count('embeds', len(embeds))
+            with stub.lock:
+                stub.batches.append([embed.get('title') for embed in embeds])
+            print(f"📨 {len(embeds)} embed(ów): " + ', '.join(embed.get('title', '?') for embed in embeds))
+            return self._reply(204, None, headers)
+
+        def do_GET(self):
+            # GET /stats - liczniki atrapy (np. do asercji w testach lub benchmarku)
+            with stub.lock:
+                return self._reply(200, dict(stub.stats))
+
+        def _reply(self, status, body, headers=None):
+            data = json.dumps(body).encode('utf-8') if body is not None else b''
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            if data:
+                self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return WebhookHandler
+
+def serve(port=8765, limit=5, window=2.0):
+    """Starts the stub in a background thread and returns the server (call .shutdown() to stop).
+
+    port=0 picks a free port (server.server_address[1]); the counters are on server.stub."""
+    stub = RateLimitedWebhookStub(limit, window)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(stub))
+    server.stub = stub
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Lokalna atrapa webhooka Discorda z limitem żądań.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--limit', type=int, default=5, help='żądań na okno')
+    parser.add_argument('--window', type=float, default=2.0, help='długość okna w sekundach')
+    args = parser.parse_args()
+
+    print(f"🧪 Atrapa webhooka Discorda: http://127.0.0.1:{args.port}/api/webhooks/1/test (limit {args.limit}/{args.window}s)")
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(RateLimitedWebhookStub(args.limit, args.window)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,74 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Konfiguracja przed importem app.py - czyta ją przy imporcie (bez webhooka Discorda). Domyślnie świeża
+# baza SQLite; TEST_DATABASE_URL=postgresql://... uruchamia testy (także te tylko dla Postgresa) na Postgresie.
+DATABASE_DIR = tempfile.mkdtemp(prefix='anonlink-tests-')
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL') or 'sqlite:///' + os.path.join(DATABASE_DIR, 'anonlink.db')
+os.environ['DISCORD_WEBHOOK_URL'] = ''
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+os.environ.setdefault('STREAMING_ENABLED', '1')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import app as anonlink
+import asgi
+
+class Client:
+    """Synchronous facade over httpx, so the same test body drives Flask (WSGI) and asgi.py (ASGI)."""
+
+    def __init__(self, mode, loop):
+        self.mode = mode
+        self.loop = loop
+        # Osobny kubełek limitu wysyłania dla każdego testu
+        self.headers = {'User-Agent': 'pytest-' + os.urandom(6).hex()}
+
+    def request(self, method, path, headers=None, **kwargs):
+        headers = {**self.headers, **(headers or {})}
+        if self.mode == 'wsgi':
+            with httpx.Client(transport=httpx.WSGITransport(app=anonlink.app), base_url='http://testserver') as client:
+                return client.request(method, path, headers=headers, **kwargs)
+        return self.loop.run_until_complete(self.request_async(method, path, headers=headers, **kwargs))
+
+    async def request_async(self, method, path, **kwargs):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi.application), base_url='http://testserver') as client:
+            return await client.request(method, path, **kwargs)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+postgres_only = pytest.mark.skipif(
+    not os.environ['DATABASE_URL'].startswith('postgres'),
+    reason='wymaga Postgresa (TEST_DATABASE_URL)'
+)
+
+@pytest.fixture(scope='session')
+def loop():
+    # Jedna pętla na całą sesję - połączenia aiosqlite z puli są związane z pętlą, w której powstały
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.run_until_complete(asgi.async_engine.dispose())
+    loop.close()
+
+@pytest.fixture(params=['wsgi', 'asgi'])
+def client(request, loop):
+    return Client(request.param, loop)
+
+@pytest.fixture
+def clients(loop):
+    return Client('wsgi', loop), Client('asgi', loop)
+
+@pytest.fixture
+def user(loop):
+    """A freshly registered user (registered through Flask, as in both deployments)."""
+    reply = Client('wsgi', loop).post('/register', json={'username': 'u' + os.urandom(5).hex()})
+    assert reply.status_code == 201
+    return reply.json()['data']
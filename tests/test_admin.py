@@ -0,0 +1,174 @@
+"""Admin API - login and throttling, bearer tokens, and keyset paging of /admin/users and /admin/messages."""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as anonlink
+
+PASSWORD = 'tajne-haslo'
+
+@pytest.fixture(autouse=True)
+def admin_password(monkeypatch):
+    monkeypatch.setattr(anonlink, 'ADMIN_PASSWORD', PASSWORD)
+
+@pytest.fixture
+def address():
+    # Osobny kubełek limitu logowania dla każdego testu (ProxyFix bierze adres z X-Forwarded-For)
+    return {'X-Forwarded-For': '10.%d.%d.%d' % tuple(os.urandom(3))}
+
+@pytest.fixture
+def auth(client, address):
+    reply = client.post('/admin/login', json={'password': PASSWORD}, headers=address)
+    assert reply.status_code == 200
+    return {'Authorization': 'Bearer ' + reply.json()['token']}
+
+def test_login(client, address):
+    reply = client.post('/admin/login', json={'password': PASSWORD}, headers=address)
+    body = reply.json()
+    assert reply.status_code == 200 and body['success'] and body['token'] and body['expires_in'] == anonlink.ADMIN_TOKEN_TTL
+
+@pytest.mark.parametrize('body, status, message', [
+    ({'password': 'zle'}, 401, 'Nieprawidłowe hasło.'),
+    ({'password': 5}, 400, 'Hasło jest wymagane.'),
+    ({}, 400, 'Hasło jest wymagane.'),
+    ([PASSWORD], 400, 'Hasło jest wymagane.'),
+])
+def test_login_failures(client, address, body, status, message):
+    reply = client.post('/admin/login', json=body, headers=address)
+    assert reply.status_code == status
+    assert reply.json() == {'success': False, 'message': message}
+
+def test_login_disabled_without_password(client, address, monkeypatch):
+    monkeypatch.setattr(anonlink, 'ADMIN_PASSWORD', '')
+    reply = client.post('/admin/login', json={'password': PASSWORD}, headers=address)
+    assert reply.status_code == 503
+    assert client.get('/admin/users').status_code == 503
+
+def test_login_is_throttled_per_address(client, address, monkeypatch):
+    monkeypatch.setattr(anonlink, 'ADMIN_LOGIN_LIMIT', '3/300')
+    for _ in range(3):
+        assert client.post('/admin/login', json={'password': 'zle'}, headers=address).status_code == 401
+    # Limit obejmuje też poprawne hasło - inaczej zgadywanie kończyłoby się sukcesem
+    throttled = client.post('/admin/login', json={'password': PASSWORD}, headers=address)
+    assert throttled.status_code == 429 and throttled.json()['message'].startswith('Zbyt wiele prób logowania.')
+
+    other = {'X-Forwarded-For': address['X-Forwarded-For'] + '1'}
+    assert client.post('/admin/login', json={'password': PASSWORD}, headers=other).status_code == 200
+
+def test_login_refused_when_limiter_fails(client, address, monkeypatch):
+    class BrokenBackend:
+        def hit(self, key, capacity, rate):
+            raise ConnectionError('redis niedostępny')
+    monkeypatch.setattr(anonlink.send_rate_limiter, 'backend', BrokenBackend())
+    reply = client.post('/admin/login', json={'password': PASSWORD}, headers=address)
+    assert reply.status_code == 503
+
+def test_login_refused_without_client_address():
+    test_client = anonlink.app.test_client()
+    reply = test_client.post('/admin/login', json={'password': PASSWORD}, environ_base={'REMOTE_ADDR': None})
+    assert reply.status_code == 503
+    assert reply.get_json() == {'success': False, 'message': 'Logowanie chwilowo niedostępne. Spróbuj ponownie później.'}
+
+def test_valid_token(client, auth):
+    assert client.get('/admin/users', headers=auth).status_code == 200
+    lowercase = {'Authorization': 'bearer ' + auth['Authorization'].split(' ', 1)[1]}
+    assert client.get('/admin/users', headers=lowercase).status_code == 200
+
+def forged_token():
+    serializer = anonlink.URLSafeTimedSerializer('inny-klucz', salt='anonlink-admin')
+    return serializer.dumps({'admin': True})
+
+@pytest.mark.parametrize('header', [
+    None,
+    'Bearer',
+    'Bearer ',
+    'Bearer nie-token',
+    'Basic {token}', # Poprawny token pod innym schematem
+    'Digest {token}', # Schemat tej samej długości co "Bearer"
+    '{token}', # Bez schematu
+    'Bearer ' + forged_token(),
+])
+def test_rejected_tokens(client, auth, header):
+    token = auth['Authorization'].split(' ', 1)[1]
+    headers = {'Authorization': header.format(token=token)} if header is not None else {}
+    reply = client.get('/admin/users', headers=headers)
+    assert reply.status_code == 401
+    assert reply.json() == {'success': False, 'message': 'Wymagane logowanie administratora.'}
+
+def test_expired_token(client, auth, monkeypatch):
+    monkeypatch.setattr(anonlink, 'ADMIN_TOKEN_TTL', -1)
+    assert client.get('/admin/users', headers=auth).status_code == 401
+
+def test_password_change_invalidates_tokens(client, auth, monkeypatch):
+    monkeypatch.setattr(anonlink, 'ADMIN_PASSWORD', 'nowe-haslo')
+    assert client.get('/admin/users', headers=auth).status_code == 401
+
+@pytest.fixture
+def admin_users_data(clients):
+    """Five users sharing a unique prefix, with created_at ties and message-count ties."""
+    wsgi_client = clients[0]
+    prefix = 'a' + os.urandom(3).hex()
+    created = datetime(2024, 1, 1)
+    users = []
+    for index, count in enumerate([2, 0, 2, 1, 0]):
+        user = wsgi_client.post('/register', json={'username': f'{prefix}{index}'}).json()['data']
+        for number in range(count):
+            wsgi_client.post('/send_message', json={'to': user['username'], 'message': f'{number}'},
+                             headers={'User-Agent': 'admin-' + os.urandom(4).hex()})
+        users.append(user)
+    with anonlink.app.app_context():
+        for index, user in enumerate(users):
+            anonlink.db.session.get(anonlink.User, user['id']).created_at = created + timedelta(days=index // 2)
+        anonlink.db.session.commit()
+    return prefix
+
+def all_pages(client, auth, path, params):
+    items, cursor, pages = [], None, 0
+    while True:
+        reply = client.get(path, params={**params, 'limit': '2', **({'cursor': cursor} if cursor else {})}, headers=auth)
+        assert reply.status_code == 200
+        body = reply.json()
+        items.extend(body['data'])
+        pages += 1
+        if not body['has_more']:
+            assert body['next_cursor'] is None
+            return items, pages
+        cursor = body['next_cursor']
+
+@pytest.mark.parametrize('sort', anonlink.ADMIN_USERS_SORT_FIELDS)
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_admin_users_cursor_paging(client, auth, admin_users_data, sort, order):
+    params = {'q': admin_users_data, 'sort': sort, 'order': order}
+    whole = client.get('/admin/users', params=params, headers=auth).json()['data']
+    assert len(whole) == 5
+
+    key = lambda user: (user[sort], user['id'])
+    assert [key(user) for user in whole] == sorted(map(key, whole), reverse=order == 'desc')
+    assert sorted(user['messages_count'] for user in whole) == [0, 0, 1, 2, 2]
+
+    paged, pages = all_pages(client, auth, '/admin/users', params)
+    assert paged == whole and pages == 3
+
+def test_admin_users_rejects_foreign_cursors(client, auth, admin_users_data):
+    first = client.get('/admin/users', params={'q': admin_users_data, 'sort': 'messages_count', 'limit': '1'}, headers=auth).json()
+    # Kursor z sortowania po liczbie wiadomości (liczba) nie pasuje do sortowania po dacie
+    for sort in ('created_at', 'username'):
+        reply = client.get('/admin/users', params={'sort': sort, 'cursor': first['next_cursor']}, headers=auth)
+        assert reply.status_code == 400 and reply.json()['message'] == 'Nieprawidłowy kursor'
+    for cursor in ('%%%', anonlink.encode_keyset('x'), anonlink.encode_keyset('nie-data', 'id')):
+        assert client.get('/admin/users', params={'cursor': cursor}, headers=auth).status_code == 400
+
+def test_admin_messages_cursor_paging(client, auth, user, clients):
+    for index in range(5):
+        clients[0].post('/send_message', json={'to': user['username'], 'message': f'm{index}'},
+                        headers={'User-Agent': 'admin-' + os.urandom(4).hex()})
+    whole = client.get('/admin/messages', params={'username': user['username']}, headers=auth).json()['data']
+    assert [message['message'] for message in whole] == ['m4', 'm3', 'm2', 'm1', 'm0']
+    assert whole[0]['recipient_username'] == user['username']
+
+    paged, pages = all_pages(client, auth, '/admin/messages', {'user_id': user['id']})
+    assert paged == whole and pages == 3
+
+    reply = client.get('/admin/messages', params={'cursor': anonlink.encode_keyset(1, 2)}, headers=auth)
+    assert reply.status_code == 400
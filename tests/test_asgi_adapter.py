@@ -0,0 +1,61 @@
+"""asgi.PooledWsgiToAsgi relies on asgiref internals - these tests fail if an asgiref upgrade changes them."""
+import asyncio
+import os
+import re
+import threading
+import time
+from importlib.metadata import version
+
+import asgiref.wsgi
+
+import asgi
+
+def pinned_asgiref():
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'requirements-async.txt')
+    with open(path) as requirements:
+        return re.search(r'^asgiref==(\S+)', requirements.read(), re.M).group(1)
+
+def test_installed_asgiref_is_the_pinned_one():
+    assert version('asgiref') == pinned_asgiref()
+
+def test_run_wsgi_app_is_still_a_sync_to_async_wrapper():
+    assert callable(asgi.unwrapped_run_wsgi_app())
+    pooled = asgi.PooledWsgiToAsgiInstance.__dict__['run_wsgi_app']
+    assert pooled._executor is asgi.wsgi_executor and not pooled._thread_sensitive
+    assert issubclass(asgi.PooledWsgiToAsgiInstance, asgiref.wsgi.WsgiToAsgiInstance)
+
+def call(application, path='/'):
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'', 'headers': [], 'http_version': '1.1'}
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        await application(scope, receive, send)
+        return sent
+    return run()
+
+def test_requests_run_in_parallel_on_the_pool(loop):
+    threads = []
+
+    def slow_app(environ, start_response):
+        threads.append(threading.current_thread().name)
+        time.sleep(0.3)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'ok']
+
+    application = asgi.PooledWsgiToAsgi(slow_app)
+
+    async def scenario():
+        return await asyncio.gather(*[call(application) for _ in range(4)])
+
+    started = time.perf_counter()
+    responses = loop.run_until_complete(scenario())
+    # Jeden wspólny wątek asgiref wykonałby je po kolei (~1,2 s)
+    assert time.perf_counter() - started < 0.9
+    assert all(sent[0]['status'] == 200 and sent[1]['body'] == b'ok' for sent in responses)
+    assert len(set(threads)) == 4 and all(name.startswith('wsgi') for name in threads)
@@ -0,0 +1,89 @@
+"""Background deletion jobs - delete_user/clear_messages, claiming, and recovery of orphaned jobs."""
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as anonlink
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+def job_status(job_id):
+    with anonlink.app.app_context():
+        return anonlink.db.session.get(anonlink.DeletionJob, job_id).status
+
+def orphan(user, status, age_seconds, heartbeat_age=None):
+    """A job row as a crashed worker would leave it (never queued in this process)."""
+    now = datetime.utcnow()
+    with anonlink.app.app_context():
+        job = anonlink.DeletionJob(
+            id=anonlink.generate_id(), kind='clear_messages', user_id=user['id'], username=user['username'],
+            status=status, deleted_messages=0, cutoff=now, created_at=now - timedelta(seconds=age_seconds),
+            heartbeat_at=now - timedelta(seconds=heartbeat_age) if heartbeat_age is not None else None
+        )
+        anonlink.db.session.add(job)
+        anonlink.db.session.commit()
+        return job.id
+
+def send(client, user, count):
+    for index in range(count):
+        assert client.post('/send_message', json={'to': user['username'], 'message': f'm{index}'}).status_code == 200
+
+def test_delete_user_runs_in_background(client, user):
+    send(client, user, 3)
+    reply = client.request('DELETE', '/delete_user', json={'username': user['username']})
+    assert reply.status_code == 202
+    body = reply.json()
+    assert body['message'] == f"Usunięcie konta użytkownika {user['username']} zostało zlecone (zadanie {body['job_id']})."
+
+    assert wait_for(lambda: client.get(body['status_url']).json()['job']['status'] == 'done')
+    job = client.get(body['status_url']).json()['job']
+    assert job['kind'] == 'delete_user' and job['deleted_messages'] == 3 and job['finished_at']
+    assert client.get('/check_user', params={'user': user['username']}).json()['exists'] is False
+
+def test_clear_messages_keeps_account(client, user):
+    send(client, user, 2)
+    reply = client.post('/clear_messages', json={'username': user['username']})
+    assert reply.status_code == 202
+    assert wait_for(lambda: job_status(reply.json()['job_id']) == 'done')
+    assert client.get('/get_messages', params={'user': user['username']}).json()['messages'] == []
+    assert client.get('/check_user', params={'user': user['username']}).json()['exists'] is True
+
+def test_unknown_job(client):
+    reply = client.get('/jobs/nie_ma')
+    assert reply.status_code == 404 and reply.json() == {'success': False, 'message': 'Zadanie nie istnieje.'}
+
+def test_job_is_claimed_once(user):
+    job_id = orphan(user, 'pending', 0)
+    with anonlink.app.app_context():
+        assert anonlink.claim_deletion_job(job_id) is True
+        assert anonlink.claim_deletion_job(job_id) is False # Inny worker już go wykonuje
+    assert job_status(job_id) == 'running'
+
+@pytest.mark.parametrize('status, age, heartbeat_age, recovered', [
+    ('pending', 600, None, True), # Zlecone, ale kolejka workera zginęła razem z nim
+    ('running', 600, 600, True), # Worker padł w trakcie - heartbeat ustał
+    ('running', 600, None, True),
+    ('pending', 0, None, False), # Świeże - pewnie jeszcze czeka w kolejce innego workera
+    ('running', 600, 1, False), # Żywy worker odświeża heartbeat
+])
+def test_orphaned_jobs_are_requeued(user, status, age, heartbeat_age, recovered):
+    job_id = orphan(user, status, age, heartbeat_age)
+    with anonlink.app.app_context():
+        anonlink.requeue_orphaned_deletion_jobs()
+    if recovered:
+        assert wait_for(lambda: job_status(job_id) == 'done')
+    else:
+        time.sleep(0.2)
+        assert job_status(job_id) == status
+
+def test_sweeper_recovers_orphans(user):
+    job_id = orphan(user, 'running', 600, 600)
+    anonlink.DeletionJobSweeper(3600).ensure_started() # Pierwszy przegląd od razu po starcie
+    assert wait_for(lambda: job_status(job_id) == 'done')
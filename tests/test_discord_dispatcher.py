@@ -0,0 +1,104 @@
+"""DiscordWebhookDispatcher against discord_stub.py - batching, the 6000-character split, 429 handling and shutdown."""
+import queue
+import time
+
+import pytest
+import requests
+
+import app as anonlink
+import discord_stub
+
+@pytest.fixture
+def stub():
+    server = discord_stub.serve(port=0, limit=100, window=1.0)
+    server.url = f'http://127.0.0.1:{server.server_address[1]}/api/webhooks/1/test'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def embed(title, description=''):
+    return {'title': title, 'description': description}
+
+def titles(count, prefix='e'):
+    return [f'{prefix}{index}' for index in range(count)]
+
+def test_embeds_are_batched_up_to_ten(stub):
+    dispatcher = anonlink.DiscordWebhookDispatcher(stub.url, linger=0.3)
+    for title in titles(25):
+        assert dispatcher.enqueue(embed(title))
+    dispatcher.shutdown(timeout=5)
+
+    assert stub.stub.batches == [titles(25)[:10], titles(25)[10:20], titles(25)[20:]]
+    stats = dispatcher.stats()
+    assert stats['batches_sent'] == 3 and stats['embeds_sent'] == 25 and stats['queue_depth'] == 0
+
+def test_batches_are_split_at_6000_characters_in_order(stub):
+    dispatcher = anonlink.DiscordWebhookDispatcher(stub.url, linger=0.3)
+    for title in titles(5):
+        dispatcher.enqueue(embed(title, 'x' * 2500))
+    dispatcher.shutdown(timeout=5)
+
+    # 2 x 2500 mieści się w 6000, trzeci embed otwiera następną paczkę - przed nowszymi zdarzeniami
+    assert stub.stub.batches == [['e0', 'e1'], ['e2', 'e3'], ['e4']]
+
+def test_overflow_embed_opens_the_next_batch():
+    dispatcher = anonlink.DiscordWebhookDispatcher('http://unused', max_queue_size=3, linger=0)
+    for item in (embed('a', 'x' * 3000), embed('b', 'x' * 2500), embed('c', 'x' * 2500)):
+        dispatcher._queue.put_nowait(item)
+    assert [item['title'] for item in dispatcher._next_batch()] == ['a', 'b']
+    # Kolejka pełna z nowszymi zdarzeniami - konsument niczego do niej nie odkłada, więc się nie blokuje
+    for title in ('d', 'e', 'f'):
+        dispatcher._queue.put_nowait(embed(title))
+    assert [item['title'] for item in dispatcher._next_batch()] == ['c', 'd', 'e', 'f']
+
+def test_stop_seen_mid_batch_still_delivers_carried_embed():
+    dispatcher = anonlink.DiscordWebhookDispatcher('http://unused', linger=0)
+    for item in (embed('a', 'x' * 4000), embed('b', 'x' * 4000), None):
+        dispatcher._queue.put_nowait(item)
+    assert [item['title'] for item in dispatcher._next_batch()] == ['a']
+    assert [item['title'] for item in dispatcher._next_batch()] == ['b']
+    assert dispatcher._next_batch() is None
+
+def test_429_waits_for_retry_after(stub):
+    stub.stub.limit = 1
+    stub.stub.window = 0.5
+    requests.post(stub.url, json={'embeds': [embed('zajmuje limit')]}, timeout=5) # Wyczerpuje okno atrapy
+
+    dispatcher = anonlink.DiscordWebhookDispatcher(stub.url, linger=0)
+    started = time.monotonic()
+    dispatcher.enqueue(embed('po limicie'))
+    dispatcher.shutdown(timeout=5)
+
+    stats = dispatcher.stats()
+    assert stats['rate_limited'] == 1 and stats['batches_sent'] == 1 and stats['failed_batches'] == 0
+    assert stub.stub.batches[-1] == ['po limicie']
+    assert time.monotonic() - started >= 0.2 # Czekał na Retry-After zamiast ponawiać od razu
+
+def test_shutdown_drains_queue_and_rejects_new_embeds(stub):
+    dispatcher = anonlink.DiscordWebhookDispatcher(stub.url, linger=0.05)
+    for title in titles(15):
+        dispatcher.enqueue(embed(title))
+    dispatcher.shutdown(timeout=5)
+
+    assert [title for batch in stub.stub.batches for title in batch] == titles(15)
+    assert not dispatcher._thread.is_alive()
+    assert dispatcher.enqueue(embed('po zamknięciu')) is False
+    assert dispatcher.stats()['dropped'] == 1
+
+def test_shutdown_with_full_queue_does_not_hang(stub):
+    dispatcher = anonlink.DiscordWebhookDispatcher(stub.url, max_queue_size=2, linger=0)
+    dispatcher.bucket = anonlink.TokenBucket(1, 0.001) # Druga paczka czeka na token ~1000 s
+    dispatcher.enqueue(embed('pierwsza'))
+    deadline = time.monotonic() + 5
+    while not stub.stub.batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+    dispatcher.enqueue(embed('czeka na token'))
+    time.sleep(0.1) # Wątek wysyłający wziął ją z kolejki i czeka w bucket.acquire()
+    for title in titles(2):
+        assert dispatcher.enqueue(embed(title))
+    with pytest.raises(queue.Full):
+        dispatcher._queue.put_nowait(embed('pełna'))
+
+    started = time.monotonic()
+    dispatcher.shutdown(timeout=0.3)
+    assert time.monotonic() - started < 2
@@ -0,0 +1,72 @@
+"""GET /export_all_data - one ordered scan streamed as the JSON document or NDJSON."""
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import app as anonlink
+
+def add_messages(user_id, rows):
+    with anonlink.app.app_context():
+        for message_id, text, timestamp in rows:
+            anonlink.db.session.add(anonlink.Message(id=message_id, message=text, timestamp=timestamp, user_id=user_id))
+        anonlink.db.session.commit()
+
+def ndjson_records(content):
+    return [json.loads(line) for line in content.decode('utf-8').splitlines()]
+
+def test_messages_are_grouped_by_user_in_time_order(client, user, clients):
+    other = clients[0].post('/register', json={'username': user['username'] + 'o'}).json()['data']
+    now = datetime.utcnow().replace(microsecond=0)
+    tied = anonlink.generate_id()
+    # Wiadomości obu użytkowników przeplatają się w czasie; dwie mają ten sam timestamp (rozstrzyga id)
+    add_messages(user['id'], [(anonlink.generate_id(), 'u3', now + timedelta(seconds=3)), (tied + 'b', 'u1b', now), (tied + 'a', 'u1a', now)])
+    add_messages(other['id'], [(anonlink.generate_id(), 'o2', now + timedelta(seconds=2)), (anonlink.generate_id(), 'o0', now - timedelta(seconds=1))])
+
+    data = client.get('/export_all_data').json()['data']
+    assert list(data) == sorted(data, key=lambda username: data[username]['id']) # Użytkownicy po id
+    assert [message['message'] for message in data[user['username']]['messages']] == ['u1a', 'u1b', 'u3']
+    assert [message['message'] for message in data[other['username']]['messages']] == ['o0', 'o2']
+    assert set(data[user['username']]) == {'id', 'username', 'created_at', 'link', 'messages'}
+    assert set(data[user['username']]['messages'][0]) == {'id', 'message', 'timestamp', 'read'}
+
+def test_ndjson_matches_json_document(client, user):
+    client.post('/send_message', json={'to': user['username'], 'message': 'hej'})
+    document = client.get('/export_all_data').json()
+    reply = client.get('/export_all_data', params={'format': 'ndjson'})
+    assert reply.headers['Content-Type'].startswith('application/x-ndjson')
+
+    rebuilt = {}
+    seen_users = []
+    for record in ndjson_records(reply.content):
+        if record.pop('type') == 'user':
+            seen_users.append(record['id'])
+            rebuilt[record['username']] = {**record, 'messages': []}
+        else:
+            owner_id = record.pop('user_id')
+            owner = next(user_data for user_data in rebuilt.values() if user_data['id'] == owner_id)
+            assert owner['id'] == seen_users[-1] # Wiadomości zaraz po swoim użytkowniku
+            owner['messages'].append(record)
+    assert len(seen_users) == len(set(seen_users))
+    assert rebuilt == document['data']
+
+def test_user_without_messages_is_exported(client, user):
+    data = client.get('/export_all_data').json()['data']
+    assert data[user['username']]['messages'] == []
+    assert data[user['username']]['link'] == user['link']
+
+def test_gzip_download_and_transport_compression(client, user):
+    plain = client.get('/export_all_data', params={'format': 'ndjson'}).content
+
+    download = client.get('/export_all_data', params={'format': 'ndjson', 'gzip': '1'})
+    assert download.headers['Content-Type'] == 'application/gzip'
+    assert download.headers['Content-Disposition'] == 'attachment; filename=anonlink_export.ndjson.gz'
+    assert gzip.decompress(download.content) == plain
+
+    compressed = client.get('/export_all_data', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip' and 'Accept-Encoding' in compressed.headers['Vary']
+    assert compressed.json()['success'] is True # httpx rozpakowuje gzip
+
+def test_unknown_format(client):
+    reply = client.get('/export_all_data', params={'format': 'csv'})
+    assert reply.status_code == 400
+    assert reply.json() == {'success': False, 'message': 'Nieobsługiwany format eksportu (dostępne: json, ndjson).'}
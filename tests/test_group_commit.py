@@ -0,0 +1,98 @@
+"""GroupCommitWriter: batching, withdrawing timed-out rows and the direct insert when the queue is full."""
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+import app as anonlink
+
+def message_row(user_id, text):
+    return {'id': anonlink.generate_id(), 'message': text, 'timestamp': datetime.utcnow(), 'read': False, 'user_id': user_id}
+
+def stored(message_id):
+    with anonlink.app.app_context():
+        return anonlink.db.session.get(anonlink.Message, message_id) is not None
+
+def slow_first_flush(writer, seconds):
+    """Makes the writer's first batch take `seconds`, so the rows behind it wait in the queue."""
+    flush = writer._flush
+    calls = []
+
+    def delayed(batch):
+        if not calls:
+            calls.append(batch)
+            time.sleep(seconds)
+        flush(batch)
+    writer._flush = delayed
+
+def write_in_thread(writer, row, errors):
+    def run():
+        try:
+            with anonlink.app.app_context():
+                writer.write(row)
+        except Exception as e:
+            errors.append(e)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+def test_concurrent_writes_share_batches(user):
+    writer = anonlink.GroupCommitWriter(anonlink.Message.__table__, window_seconds=0.05)
+    rows = [message_row(user['id'], f'm{index}') for index in range(20)]
+    errors = []
+    for thread in [write_in_thread(writer, row, errors) for row in rows]:
+        thread.join()
+
+    assert errors == []
+    assert all(stored(row['id']) for row in rows)
+    stats = writer.stats()
+    assert stats['rows'] == 20 and stats['batches'] < 20
+
+def test_timed_out_row_is_withdrawn_not_written(user):
+    writer = anonlink.GroupCommitWriter(anonlink.Message.__table__, window_seconds=0.01, timeout=0.1)
+    slow_first_flush(writer, 0.4)
+    first, late = message_row(user['id'], 'pierwsza'), message_row(user['id'], 'spóźniona')
+    errors = []
+    thread = write_in_thread(writer, first, errors)
+    time.sleep(0.05) # Pierwszy wiersz jest już w zapisie
+
+    with anonlink.app.app_context(), pytest.raises(anonlink.GroupCommitTimeout):
+        writer.write(late)
+    thread.join()
+    time.sleep(0.1) # Wątek zapisu zdejmuje wycofany wiersz z kolejki
+
+    # Wiersz w trakcie zapisu czeka na wynik mimo timeoutu; wycofany nie trafia do bazy
+    assert errors == [] and stored(first['id'])
+    assert not stored(late['id'])
+    assert writer.stats()['cancelled'] == 1 and writer.stats()['queue_depth'] == 0
+
+def test_full_queue_falls_back_to_direct_insert(user):
+    writer = anonlink.GroupCommitWriter(anonlink.Message.__table__, window_seconds=0.01, max_queue=1)
+    slow_first_flush(writer, 0.3)
+    rows = [message_row(user['id'], f'm{index}') for index in range(3)]
+    errors = []
+    threads = [write_in_thread(writer, rows[0], errors)]
+    time.sleep(0.05)
+    threads.append(write_in_thread(writer, rows[1], errors)) # Zajmuje jedyne miejsce w kolejce
+    time.sleep(0.05)
+
+    started = time.monotonic()
+    with anonlink.app.app_context():
+        writer.write(rows[2])
+    assert time.monotonic() - started < 0.2 # Nie czekał na wątek zapisu
+    for thread in threads:
+        thread.join()
+
+    assert errors == [] and all(stored(row['id']) for row in rows)
+    assert writer.stats()['direct_writes'] == 1
+
+class TimingOutWriter:
+    def write(self, row):
+        raise anonlink.GroupCommitTimeout('test')
+
+def test_send_message_reports_withdrawn_write(client, user, monkeypatch):
+    monkeypatch.setattr(anonlink, 'message_writer', TimingOutWriter())
+    reply = client.post('/send_message', json={'to': user['username'], 'message': 'hej'})
+    assert reply.status_code == 503
+    assert reply.json() == {'success': False, 'message': 'Serwer jest przeciążony - wiadomość nie została wysłana. Spróbuj ponownie.'}
@@ -0,0 +1,139 @@
+"""The hot endpoints answer the same under Flask (WSGI) and asgi.py (ASGI) - every test runs in both modes."""
+import asyncio
+import time
+
+import pytest
+
+import app as anonlink
+
+@pytest.mark.parametrize('body, message', [
+    (None, 'Brak danych'),
+    ({}, 'Brak danych'),
+    ({'to': 'ktos'}, 'Odbiorca i wiadomość są wymagane'),
+    ({'to': '  ', 'message': 'hej'}, 'Odbiorca i wiadomość są wymagane'),
+    ({'to': 5, 'message': 'hej'}, 'Odbiorca i wiadomość są wymagane'),
+    ({'to': 'ktos', 'message': 'x' * 1001}, 'Wiadomość nie może być dłuższa niż 1000 znaków'),
+])
+def test_send_message_validation(client, body, message):
+    kwargs = {'json': body} if body is not None else {'content': b'nie json', 'headers': {'Content-Type': 'application/json'}}
+    reply = client.post('/send_message', **kwargs)
+    assert reply.status_code == 400
+    assert reply.json() == {'success': False, 'message': message}
+
+def test_send_message_to_unknown_user(client):
+    reply = client.post('/send_message', json={'to': 'nie_ma_takiego', 'message': 'hej'})
+    assert reply.status_code == 404
+    assert reply.json() == {'success': False, 'message': 'Użytkownik nie istnieje'}
+
+def test_sent_messages_are_listed_newest_first(client, user):
+    for text in ('pierwsza', 'druga'):
+        reply = client.post('/send_message', json={'to': user['username'], 'message': f'  {text} '})
+        assert reply.status_code == 200
+        assert reply.json() == {'success': True, 'message': 'Wiadomość wysłana!'}
+
+    body = client.get('/get_messages', params={'user': user['username']}).json()
+    assert [message['message'] for message in body['messages']] == ['druga', 'pierwsza']
+    assert body['count'] == 2 and body['has_more'] is False and body['latest_cursor']
+    assert set(body['messages'][0]) == {'id', 'message', 'timestamp', 'read'}
+
+def test_send_message_rate_limit(client, user):
+    capacity = int(anonlink.send_rate_limiter.per_sender[0])
+    for _ in range(capacity):
+        assert client.post('/send_message', json={'to': user['username'], 'message': 'hej'}).status_code == 200
+    reply = client.post('/send_message', json={'to': user['username'], 'message': 'hej'})
+    assert reply.status_code == 429
+    assert reply.headers['Retry-After'] == str(reply.json()['retry_after'])
+    assert reply.json()['success'] is False
+
+def test_get_messages_etag(client, user):
+    first = client.get('/get_messages', params={'user_id': user['id']})
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and first.headers['Cache-Control'] == 'no-cache'
+
+    cached = client.get('/get_messages', params={'user_id': user['id']}, headers={'If-None-Match': etag})
+    assert cached.status_code == 304 and cached.headers['ETag'] == etag and cached.content == b''
+
+    client.post('/send_message', json={'to': user['username'], 'message': 'nowa'})
+    changed = client.get('/get_messages', params={'user_id': user['id']}, headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+
+def test_etag_is_shared_between_modes(clients, user):
+    wsgi_client, asgi_client = clients
+    params = {'user': user['username'], 'limit': '5'}
+    wsgi_reply = wsgi_client.get('/get_messages', params=params)
+    asgi_reply = asgi_client.get('/get_messages', params=params)
+    assert wsgi_reply.headers['ETag'] == asgi_reply.headers['ETag']
+    assert wsgi_reply.json() == asgi_reply.json()
+    assert asgi_client.get('/get_messages', params=params, headers={'If-None-Match': wsgi_reply.headers['ETag']}).status_code == 304
+
+@pytest.mark.parametrize('params, status, message', [
+    ({'user': 'nie_ma_takiego'}, 404, 'Użytkownik nie istnieje'),
+    ({'before': 'x', 'since': 'y'}, 400, 'Parametry before i since wykluczają się'),
+    ({'limit': 'abc'}, 400, 'Nieprawidłowy parametr limit, before lub since'),
+    ({'since': '%%%'}, 400, 'Nieprawidłowy parametr limit, before lub since'),
+])
+def test_get_messages_errors(client, user, params, status, message):
+    reply = client.get('/get_messages', params={'user': user['username'], **params})
+    assert reply.status_code == status
+    assert reply.json() == {'success': False, 'message': message}
+
+def test_get_messages_pagination(client, user):
+    for index in range(3):
+        client.post('/send_message', json={'to': user['username'], 'message': f'm{index}'})
+    page = client.get('/get_messages', params={'user': user['username'], 'limit': '2'}).json()
+    assert [message['message'] for message in page['messages']] == ['m2', 'm1'] and page['has_more']
+    rest = client.get('/get_messages', params={'user': user['username'], 'limit': '2', 'before': page['next_cursor']}).json()
+    assert [message['message'] for message in rest['messages']] == ['m0'] and not rest['has_more']
+    newer = client.get('/get_messages', params={'user': user['username'], 'since': rest['latest_cursor'] or page['latest_cursor']}).json()
+    assert newer['messages'] == []
+
+def test_compression_and_cors(client, user):
+    for index in range(8):
+        client.post('/send_message', json={'to': user['username'], 'message': f'{index} ' + 'treść ' * 25})
+    reply = client.get('/get_messages', params={'user': user['username']}, headers={
+        'Accept-Encoding': 'gzip',
+        'Origin': 'https://anonlink.fun'
+    })
+    assert reply.status_code == 200
+    assert reply.headers['Content-Encoding'] == 'gzip'
+    assert reply.headers['ETag'].startswith('W/') # Skompresowane bajty - słaby ETag
+    assert reply.headers['Access-Control-Allow-Origin'] == 'https://anonlink.fun'
+    assert 'Accept-Encoding' in reply.headers['Vary'] and 'Origin' in reply.headers['Vary']
+    assert reply.headers['X-Request-ID']
+    assert reply.json()['count'] == 8 # httpx rozpakowuje gzip
+
+def test_get_user_details(client, user):
+    expected = {'exists': True, 'username': user['username'], 'id': user['id'], 'link': user['link'], 'message': 'Użytkownik znaleziony'}
+    assert client.get('/get_user_details', params={'username': user['username']}).json() == expected
+    assert client.get('/get_user_details', params={'user_id': user['id']}).json() == expected
+    missing = client.get('/get_user_details')
+    assert missing.status_code == 400
+    assert missing.json() == {'exists': False, 'message': 'Nazwa użytkownika lub ID jest wymagane'}
+
+def test_check_user(client, user):
+    assert client.get('/check_user', params={'user': user['username']}).json() == {'exists': True, 'username': user['username']}
+    assert client.get('/check_user', params={'user': 'nie_ma_takiego'}).json() == {'exists': False, 'username': None}
+    missing = client.get('/check_user')
+    assert missing.status_code == 400
+    assert missing.json() == {'exists': False, 'message': 'Brak nazwy użytkownika'}
+
+def test_waiting_fallback_request_does_not_block_others(loop, user):
+    """A long-poll served by Flask through asgi.py must not hold up other Flask-served requests."""
+    import asgi
+    from conftest import Client
+    client = Client('asgi', loop)
+
+    async def scenario():
+        poll = asyncio.ensure_future(client.request_async('GET', '/poll_messages', params={'user': user['username'], 'timeout': '2'}))
+        await asyncio.sleep(0.2)
+        started = time.perf_counter()
+        health = await client.request_async('GET', '/api/health/live')
+        elapsed = time.perf_counter() - started
+        assert not poll.done()
+        await poll
+        return health, elapsed
+
+    assert anonlink.STREAMING_ENABLED and asgi.ASGI_WSGI_THREADS > 1
+    health, elapsed = loop.run_until_complete(scenario())
+    assert health.status_code == 200
+    assert elapsed < 1
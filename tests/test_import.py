@@ -0,0 +1,167 @@
+"""POST /import_all_data - JSON and NDJSON round-trips through /export_all_data, and rejected input."""
+import gzip
+import json
+import os
+
+import pytest
+
+import app as anonlink
+from conftest import postgres_only
+
+def export(client, **params):
+    reply = client.get('/export_all_data', params=params)
+    assert reply.status_code == 200
+    return reply
+
+def snapshot(client):
+    return export(client).json()['data']
+
+def populated(client, user):
+    for text in ('pierwsza', 'druga'):
+        client.post('/send_message', json={'to': user['username'], 'message': text})
+    client.post('/mark_read', json={'username': user['username'], 'up_to': client.get(
+        '/get_messages', params={'user': user['username'], 'limit': '1'}
+    ).json()['next_cursor']})
+    return snapshot(client)
+
+def table_names():
+    with anonlink.app.app_context():
+        return set(anonlink.db.inspect(anonlink.db.engine).get_table_names())
+
+@pytest.mark.parametrize('mode', ['staging', 'direct'])
+def test_json_round_trip(client, user, mode):
+    before = populated(client, user)
+    assert user['username'] in before and len(before[user['username']]['messages']) == 2
+
+    reply = client.post('/import_all_data', params={'mode': mode, 'batch_size': '3'}, json=before)
+    assert reply.status_code == 200
+    body = reply.json()
+    assert body['success'] and body['mode'] == mode and body['imported_users'] == len(before)
+    assert body['imported_messages'] == sum(len(user_data['messages']) for user_data in before.values())
+
+    assert snapshot(client) == before
+    assert not any('_import_staging_' in name or '_old_' in name for name in table_names())
+
+@pytest.mark.parametrize('mode', ['staging', 'direct'])
+@pytest.mark.parametrize('compressed', [False, True])
+def test_ndjson_round_trip(client, user, mode, compressed):
+    before = populated(client, user)
+    ndjson = export(client, format='ndjson').content
+    headers = {'Content-Type': 'application/x-ndjson'}
+    if compressed:
+        ndjson = gzip.compress(ndjson)
+        headers['Content-Encoding'] = 'gzip'
+
+    reply = client.post('/import_all_data', params={'mode': mode, 'batch_size': '2'}, content=ndjson, headers=headers)
+    assert reply.status_code == 200 and reply.json()['imported_users'] == len(before)
+    assert snapshot(client) == before
+
+def test_imported_accounts_work(client):
+    username = 'imp' + os.urandom(4).hex()
+    data = {username: {'id': '1600000000000', 'username': username, 'created_at': '2020-09-13T12:26:40', 'messages': [
+        {'id': '1600000000001', 'message': 'stara', 'timestamp': '2020-09-13T12:26:41', 'read': False}
+    ]}}
+    assert client.post('/import_all_data', json=data).status_code == 200
+    assert client.get('/check_user', params={'user': username}).json() == {'exists': True, 'username': username}
+    assert [message['message'] for message in client.get('/get_messages', params={'user': username}).json()['messages']] == ['stara']
+
+MALFORMED_NDJSON = [
+    (b'{"type": "user", "username": "a1"}\n{nie json\n', 'Nieprawidłowy JSON w linii 2.'),
+    (b'{"type": "user", "username": "a1"}\n{"type": "tag"}\n', 'Nieznany typ rekordu w linii 2 (oczekiwano "user" lub "message").'),
+    (b'{"type": "message", "message": "bez user_id"}\n', 'Nieznany typ rekordu w linii 1 (oczekiwano "user" lub "message").'),
+    (b'{"type": "user", "username": "a1", "created_at": "wczoraj"}\n', 'Nieprawidłowa data utworzenia dla użytkownika: a1.'),
+    (b'{"type": "user"}\n', 'Nieprawidłowy format danych użytkownika.'),
+]
+
+@pytest.mark.parametrize('mode', ['staging', 'direct'])
+@pytest.mark.parametrize('body, message', MALFORMED_NDJSON)
+def test_malformed_ndjson_leaves_tables_untouched(client, user, mode, body, message):
+    before = populated(client, user)
+    reply = client.post('/import_all_data', params={'mode': mode, 'batch_size': '1'}, content=body,
+                        headers={'Content-Type': 'application/x-ndjson'})
+    assert reply.status_code == 400
+    assert reply.json() == {'success': False, 'message': message}
+    assert snapshot(client) == before
+
+@pytest.mark.parametrize('mode', ['staging', 'direct'])
+@pytest.mark.parametrize('data, message', [
+    ({'a1': {'username': 'a1'}}, 'Nieprawidłowy format danych dla użytkownika: a1.'),
+    ({'a1': {'username': 'a1', 'messages': 'x'}}, 'Nieprawidłowy format wiadomości dla użytkownika: a1.'),
+    ({'a1': {'id': '9', 'username': 'a1', 'messages': [{'text': 'bez message'}]}}, 'Nieprawidłowy format wiadomości dla użytkownika o ID: 9.'),
+    ([], 'Brak danych JSON lub nieprawidłowy format (oczekiwano obiektu).'),
+])
+def test_malformed_json_leaves_tables_untouched(client, user, mode, data, message):
+    before = populated(client, user)
+    reply = client.post('/import_all_data', params={'mode': mode}, json=data)
+    assert reply.status_code == 400
+    assert reply.json() == {'success': False, 'message': message}
+    assert snapshot(client) == before
+
+def test_duplicate_rows_leave_tables_untouched_in_staging_mode(client, user):
+    before = populated(client, user)
+    data = {
+        'a1': {'id': '77', 'username': 'a1', 'messages': []},
+        'a2': {'id': '77', 'username': 'a2', 'messages': []}
+    }
+    reply = client.post('/import_all_data', json=data)
+    assert reply.status_code == 400
+    assert reply.json()['message'] == 'Dane zawierają zduplikowane ID lub nazwy użytkowników albo wiadomości bez właściciela.'
+    assert snapshot(client) == before
+    assert not any('_import_staging_' in name for name in table_names())
+
+@pytest.mark.parametrize('params, message', [
+    ({'mode': 'merge'}, 'Nieobsługiwany tryb importu (dostępne: staging, direct).'),
+    ({'batch_size': '0'}, 'Nieprawidłowy parametr batch_size.'),
+    ({'batch_size': 'x'}, 'Nieprawidłowy parametr batch_size.'),
+])
+def test_invalid_parameters(client, params, message):
+    reply = client.post('/import_all_data', params=params, json={})
+    assert reply.status_code == 400 and reply.json()['message'] == message
+
+@postgres_only
+def test_concurrent_import_is_rejected(client, user):
+    before = snapshot(client)
+    with anonlink.app.app_context(), anonlink.db.engine.connect() as connection:
+        connection.execute(anonlink.db.text('SELECT pg_advisory_lock(:id)'), {'id': anonlink.IMPORT_LOCK_ID})
+        try:
+            reply = client.post('/import_all_data', json=before)
+        finally:
+            connection.execute(anonlink.db.text('SELECT pg_advisory_unlock(:id)'), {'id': anonlink.IMPORT_LOCK_ID})
+    assert reply.status_code == 409
+    assert reply.json()['message'] == 'Inny import jest w toku. Spróbuj ponownie później.'
+    assert client.post('/import_all_data', json=before).status_code == 200
+
+@postgres_only
+def test_rename_swap_keeps_indexes_and_foreign_key(client, user):
+    def schema():
+        with anonlink.app.app_context(), anonlink.db.engine.connect() as connection:
+            indexes = {
+                (table, name) for table, name in connection.execute(anonlink.db.text(
+                    "SELECT tablename, indexname FROM pg_indexes WHERE schemaname = current_schema() "
+                    "AND tablename IN ('users', 'messages')"
+                ))
+            }
+            foreign_keys = set(connection.execute(anonlink.db.text(
+                "SELECT conname, confrelid::regclass::text FROM pg_constraint "
+                "WHERE conrelid = 'messages'::regclass AND contype = 'f'"
+            )))
+        return indexes, foreign_keys
+
+    before = populated(client, user)
+    indexes, foreign_keys = schema()
+    assert ('messages', 'ix_messages_user_id_timestamp_id') in indexes and ('messages', 'ix_messages_timestamp_id') in indexes
+
+    assert client.post('/import_all_data', params={'mode': 'staging'}, json=before).status_code == 200
+    assert schema() == (indexes, foreign_keys)
+    assert foreign_keys == {('messages_user_id_fkey', 'users')}
+    assert snapshot(client) == before
+    assert not any('_import_staging_' in name or '_old_' in name for name in table_names())
+
+    # ON DELETE CASCADE działa na podmienionych tabelach
+    with anonlink.app.app_context():
+        anonlink.db.session.execute(anonlink.db.text('DELETE FROM users WHERE id = :id'), {'id': user['id']})
+        anonlink.db.session.commit()
+        assert anonlink.db.session.execute(anonlink.db.text(
+            'SELECT count(*) FROM messages WHERE user_id = :id'
+        ), {'id': user['id']}).scalar() == 0
+    assert json.loads(export(client).content)['success'] is True
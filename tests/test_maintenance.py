@@ -0,0 +1,42 @@
+"""Message retention and DeletionJob cleanup in run_message_maintenance (non-partitioned table)."""
+from datetime import datetime, timedelta
+
+import app as anonlink
+
+def add_message(user_id, text, timestamp):
+    message_id = anonlink.generate_id()
+    anonlink.db.session.add(anonlink.Message(id=message_id, message=text, timestamp=timestamp, user_id=user_id))
+    return message_id
+
+def test_retention_deletes_only_expired_messages(monkeypatch, user):
+    monkeypatch.setattr(anonlink, 'MESSAGE_RETENTION_DAYS', 30)
+    now = datetime.utcnow()
+    with anonlink.app.app_context():
+        expired = add_message(user['id'], 'stara', now - timedelta(days=31))
+        kept = add_message(user['id'], 'nowa', now - timedelta(days=29))
+        old_job = anonlink.DeletionJob(id=anonlink.generate_id(), kind='clear_messages', user_id=user['id'],
+                                       status='done', finished_at=now - timedelta(days=8))
+        recent_job = anonlink.DeletionJob(id=anonlink.generate_id(), kind='clear_messages', user_id=user['id'],
+                                          status='done', finished_at=now - timedelta(days=1))
+        anonlink.db.session.add_all([old_job, recent_job])
+        anonlink.db.session.commit()
+        version = anonlink.db.session.get(anonlink.User, user['id']).inbox_version
+        old_job_id, recent_job_id = old_job.id, recent_job.id
+
+        result = anonlink.run_message_maintenance()
+
+        assert result['rows_deleted'] >= 1 and result['jobs_purged'] >= 1
+        assert anonlink.db.session.get(anonlink.Message, expired) is None
+        assert anonlink.db.session.get(anonlink.Message, kept) is not None
+        assert anonlink.db.session.get(anonlink.DeletionJob, old_job_id) is None
+        assert anonlink.db.session.get(anonlink.DeletionJob, recent_job_id) is not None
+        # Usunięcie zmienia skrzynkę - ETag get_messages musi się zmienić
+        assert anonlink.db.session.get(anonlink.User, user['id']).inbox_version > version
+
+def test_no_retention_keeps_old_messages(monkeypatch, user):
+    monkeypatch.setattr(anonlink, 'MESSAGE_RETENTION_DAYS', 0)
+    with anonlink.app.app_context():
+        old = add_message(user['id'], 'bardzo stara', datetime.utcnow() - timedelta(days=3650))
+        anonlink.db.session.commit()
+        assert anonlink.run_message_maintenance()['rows_deleted'] == 0
+        assert anonlink.db.session.get(anonlink.Message, old) is not None
@@ -0,0 +1,69 @@
+"""POST /mark_read - by ids, up to a cursor, the whole inbox, and input validation."""
+import pytest
+
+def send(client, user, *texts):
+    for text in texts:
+        assert client.post('/send_message', json={'to': user['username'], 'message': text}).status_code == 200
+
+def read_flags(client, user):
+    body = client.get('/get_messages', params={'user': user['username']}).json()
+    return {message['message']: message['read'] for message in body['messages']}
+
+def test_mark_read_by_ids(client, user):
+    send(client, user, 'a', 'b', 'c')
+    messages = client.get('/get_messages', params={'user': user['username']}).json()['messages']
+    ids = [message['id'] for message in messages if message['message'] in ('a', 'c')]
+
+    reply = client.post('/mark_read', json={'username': user['username'], 'ids': ids})
+    assert reply.json() == {'success': True, 'updated': 2}
+    assert read_flags(client, user) == {'a': True, 'b': False, 'c': True}
+
+def test_mark_read_up_to_cursor(client, user):
+    send(client, user, 'a', 'b', 'c')
+    page = client.get('/get_messages', params={'user': user['username'], 'limit': '2'}).json()
+    # next_cursor wskazuje najstarszą wiadomość strony ('b') - oznaczamy ją i wszystko starsze
+    reply = client.post('/mark_read', json={'user_id': user['id'], 'up_to': page['next_cursor']})
+    assert reply.json() == {'success': True, 'updated': 2}
+    assert read_flags(client, user) == {'a': True, 'b': True, 'c': False}
+
+def test_mark_whole_inbox_is_idempotent(client, user):
+    send(client, user, 'a', 'b')
+    etag = client.get('/get_messages', params={'user': user['username']}).headers['ETag']
+
+    assert client.post('/mark_read', json={'username': user['username']}).json() == {'success': True, 'updated': 2}
+    assert read_flags(client, user) == {'a': True, 'b': True}
+    changed = client.get('/get_messages', params={'user': user['username']}, headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+
+    # Drugie wywołanie niczego nie zmienia - ETag zostaje ten sam
+    etag = changed.headers['ETag']
+    assert client.post('/mark_read', json={'username': user['username']}).json() == {'success': True, 'updated': 0}
+    assert client.get('/get_messages', params={'user': user['username']}, headers={'If-None-Match': etag}).status_code == 304
+
+def test_mark_read_only_touches_own_inbox(client, user, clients):
+    other = clients[0].post('/register', json={'username': user['username'] + 'x'}).json()['data']
+    send(client, user, 'moja')
+    message_id = client.get('/get_messages', params={'user': user['username']}).json()['messages'][0]['id']
+    assert client.post('/mark_read', json={'username': other['username'], 'ids': [message_id]}).json()['updated'] == 0
+    assert read_flags(client, user) == {'moja': False}
+
+@pytest.mark.parametrize('body, status, message', [
+    ([1, 2], 400, 'Brak danych JSON'),
+    ({'username': 5}, 400, 'Pola username, user_id i up_to muszą być tekstem'),
+    ({'user_id': ['x']}, 400, 'Pola username, user_id i up_to muszą być tekstem'),
+    ({'username': '{user}', 'up_to': 7}, 400, 'Pola username, user_id i up_to muszą być tekstem'),
+    ({'username': '{user}', 'ids': 'abc'}, 400, 'Pole ids musi być listą (maksymalnie 200 elementów)'),
+    ({'username': '{user}', 'ids': ['x'] * 201}, 400, 'Pole ids musi być listą (maksymalnie 200 elementów)'),
+    ({'username': '{user}', 'up_to': '%%%'}, 400, 'Nieprawidłowy kursor up_to'),
+    ({'username': 'nie_ma_takiego'}, 404, 'Użytkownik nie istnieje'),
+])
+def test_mark_read_validation(client, user, body, status, message):
+    if isinstance(body, dict) and body.get('username') == '{user}':
+        body = {**body, 'username': user['username']}
+    reply = client.post('/mark_read', json=body)
+    assert reply.status_code == status
+    assert reply.json() == {'success': False, 'message': message}
+
+def test_mark_read_invalid_json(client):
+    reply = client.post('/mark_read', content=b'nie json', headers={'Content-Type': 'application/json'})
+    assert reply.status_code == 400
@@ -0,0 +1,28 @@
+"""Read-your-writes pinning: only writes of user-visible data send the client's next reads to the primary."""
+import pytest
+
+import app as anonlink
+
+@pytest.fixture
+def router(monkeypatch):
+    # Router bez replik - route_reads/read_route działają jak w produkcji, odczyty i tak idą do primary
+    router = anonlink.ReplicaRouter([])
+    monkeypatch.setattr(anonlink, 'replica_router', router)
+    monkeypatch.setattr(anonlink, 'read_your_writes', anonlink.ReadYourWritesPins())
+    return router
+
+def test_read_after_write_goes_to_primary(client, user, router):
+    assert client.post('/send_message', json={'to': user['username'], 'message': 'hej'}).status_code == 200
+    assert client.get('/check_user', params={'user': user['username']}).json()['exists'] is True
+    assert router.stats()['pinned_reads'] == 1
+
+def test_logging_endpoints_do_not_pin(client, user, router):
+    assert client.post('/log_visit', json={'page': 'dashboard'}).status_code == 200
+    assert client.post('/log_activity', json={'title': 'test'}).status_code == 200
+    assert client.get('/check_user', params={'user': user['username']}).json()['exists'] is True
+    assert router.stats()['pinned_reads'] == 0
+
+def test_failed_write_does_not_pin(client, router):
+    assert client.post('/send_message', json={'to': 'nie_ma_takiego', 'message': 'hej'}).status_code == 404
+    client.get('/check_user', params={'user': 'nie_ma_takiego'})
+    assert router.stats()['pinned_reads'] == 0
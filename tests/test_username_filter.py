@@ -0,0 +1,50 @@
+"""UsernameFilter across workers - an import handled elsewhere must reach filters built before it."""
+import os
+import threading
+
+import pytest
+
+import app as anonlink
+from conftest import Client
+
+def refresh(username_filter):
+    """One pass of the filter's background thread, run inline."""
+    with anonlink.app.app_context(), anonlink.primary_reads():
+        username_filter._refresh()
+
+@pytest.fixture
+def other_worker():
+    # Filtr "innego workera": synchronizuje się przy każdym przebiegu, przebudowa co godzinę
+    return anonlink.UsernameFilter(sync_seconds=0, rebuild_seconds=3600)
+
+def test_import_reaches_filter_built_before_it(loop, user, other_worker):
+    refresh(other_worker)
+    assert user['username'] in other_worker._bloom
+
+    # Konto ze starym ID (13-cyfrowy timestamp ms) - synchronizacja po zakresie nowych ID go nie widzi
+    imported = 'imp' + os.urandom(4).hex()
+    reply = Client('wsgi', loop).post('/import_all_data', params={'mode': 'direct'}, json={
+        imported: {'id': '1600000000000', 'username': imported, 'created_at': '2020-09-13T12:26:40', 'messages': []}
+    })
+    assert reply.status_code == 200
+
+    refresh(other_worker)
+    assert imported in other_worker._bloom
+    assert other_worker.stats()['rebuilds'] == 2
+
+def test_sync_without_invalidation_does_not_rebuild(user, other_worker):
+    refresh(other_worker)
+    refresh(other_worker)
+    stats = other_worker.stats()
+    assert stats['rebuilds'] == 1 and stats['syncs'] >= 2
+
+def test_bloom_filter_add_from_many_threads():
+    bloom = anonlink.BloomFilter(10000, 0.01)
+    names = [[f'n{thread}-{index}' for index in range(2000)] for thread in range(4)]
+    threads = [threading.Thread(target=lambda chunk=chunk: [bloom.add(name) for name in chunk]) for chunk in names]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert bloom.count == 8000
+    assert all(name in bloom for chunk in names for name in chunk)